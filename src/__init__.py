@@ -4,3 +4,4 @@ from .viz import *
 from .jupyter import *
 from .problem import *
 from .poi import *
+from .geo import *
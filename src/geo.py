@@ -0,0 +1,97 @@
+""" Provides fast local geographic computations that don't need any network call """
+
+import math
+import numpy as np
+from numba import njit, prange
+
+# mean radius of the earth in meters
+EARTH_RADIUS = 6371008.8
+
+# the constants are passed with the same dtype of the coordinates, python literals
+# are float64/int64 for numba and would promote the float32 arithmetic to float64
+@njit(parallel = True, fastmath = True, cache = True)
+def _haversine(lat1, lon1, lat2, lon2, deg2rad, half, diameter, out):
+    for i in prange(lat1.shape[0]):
+        phi1 = lat1[i] * deg2rad
+        cos_phi1 = math.cos(phi1)
+        for j in range(lat2.shape[0]):
+            phi2 = lat2[j] * deg2rad
+            sin_d_phi = math.sin(half * (phi2 - phi1))
+            sin_d_lambda = math.sin(half * (lon2[j] - lon1[i]) * deg2rad)
+            a = sin_d_phi * sin_d_phi + cos_phi1 * math.cos(phi2) * sin_d_lambda * sin_d_lambda
+            out[i, j] = diameter * math.asin(math.sqrt(a))
+    return out
+
+"""Great-circle distance between every point of the first set of points and every
+point of the second one. It is the distance as the crow flies so it is always less than
+or equal to the route length you get from OSRM, which makes it a good cheap filter
+before asking OSRM for the actual routes.
+
+Parameters
+----------
+lat1, lon1: latitudes and longitudes (degrees) of the first N points
+lat2, lon2: latitudes and longitudes (degrees) of the second M points
+
+Returns
+-------
+distances: (N, M) numpy array of distances in meters, it is float32 if all the
+           coordinates are float32 and float64 otherwise
+"""
+
+def haversine(lat1, lon1, lat2, lon2):
+    arrays = [np.atleast_1d(arr) for arr in (lat1, lon1, lat2, lon2)]
+    dtype = np.result_type(np.float32, *arrays)
+    lat1, lon1, lat2, lon2 = (np.ascontiguousarray(arr, dtype = dtype) for arr in arrays)
+    out = np.empty((lat1.shape[0], lat2.shape[0]), dtype = dtype)
+    return _haversine(lat1, lon1, lat2, lon2, dtype.type(math.pi / 180), dtype.type(0.5), dtype.type(2 * EARTH_RADIUS), out)
+
+
+@njit(cache = True)
+def _decode_polyline(chars, factor):
+    # every coordinate takes at least one character so this is an upper bound
+    out = np.empty((chars.shape[0] // 2, 2), dtype = np.float64)
+    index, count = 0, 0
+    lat, lon = 0, 0
+    while index < chars.shape[0]:
+        for k in range(2):
+            result, shift = 0, 0
+            while True:
+                # numba doesn't check the bounds so we have to do it ourselves
+                if index >= chars.shape[0]:
+                    raise ValueError("The polyline is truncated")
+                b = chars[index] - 63
+                if b < 0 or b > 63:
+                    raise ValueError("The polyline has invalid character")
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            delta = ~(result >> 1) if result & 1 else result >> 1
+            if k == 0:
+                lat += delta
+            else:
+                lon += delta
+        out[count, 0] = lat / factor
+        out[count, 1] = lon / factor
+        count += 1
+    return out[:count]
+
+"""Decodes polyline string with 6 digits precision (the one OSRM returns
+with geometries=polyline6) following Google's encoded polyline algorithm
+https://developers.google.com/maps/documentation/utilities/polylinealgorithm
+
+Parameters
+----------
+encoded: the encoded polyline string
+
+Returns
+-------
+points: (N, 2) numpy array of (latitude, longitude) points
+
+Raises ValueError if the string is not a valid polyline
+"""
+
+def decode_polyline6(encoded):
+    chars = np.frombuffer(encoded.encode('ascii'), dtype = np.uint8)
+    return _decode_polyline(chars, 1e6)
@@ -1,6 +1,266 @@
+import asyncio
+import weakref
 import requests
+import numpy as np
+from functools import lru_cache
+from collections import OrderedDict
+from importlib.util import find_spec
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from ipywidgets import HTML
-from ipyleaflet import Map, Marker, AntPath, Popup
+from ipyleaflet import Map, Marker, AntPath, Popup, LayerGroup
+from .geo import haversine, decode_polyline6, EARTH_RADIUS
+
+# orjson parses the big OSRM responses faster, but the standard json is good enough
+try:
+    from orjson import loads as _loads
+except ImportError:
+    from json import loads as _loads
+
+
+# Nominatim usage policy requires a valid user agent identifying the application
+_USER_AGENT = "SmartMobilityAlgorithms-Utilities"
+
+"""Builds the HTTP session shared by every poi object so consecutive calls
+to Nominatim and OSRM reuse the same keep-alive connections instead of doing
+a new TCP/TLS handshake for every single request
+"""
+
+def _make_session(session = None):
+    if session is None:
+        session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections = 16,
+        pool_maxsize = 64,
+        max_retries = Retry(total = 3, backoff_factor = 0.3)
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    session.headers.update({"User-Agent": _USER_AGENT})
+    return session
+
+# (connect, read) timeouts in seconds for every request we issue
+_TIMEOUT = (3, 10)
+
+# check https://nominatim.org/release-docs/develop/
+# the query is url-encoded so names with characters like & or # don't break the url
+def _geocode_url(name, country):
+    if not str(name).strip():
+        raise ValueError("The name of the place can't be empty")
+    query = urlencode({'q': f'{name} - {country}', 'format': 'geocodejson'})
+    return f'https://nominatim.openstreetmap.org/search?{query}'
+
+# check http://project-osrm.org/docs/v5.22.0/api/#general-options
+def _route_url(src, dest, mode):
+    return f'http://router.project-osrm.org/route/v1/{mode}/{src[0]},{src[1]};{dest[0]},{dest[1]}?overview=full&geometries=polyline6&steps=false'
+
+# check http://project-osrm.org/docs/v5.22.0/api/#table-service
+def _table_url(coords, mode):
+    coords = ';'.join(f'{lon},{lat}' for lon, lat in coords)
+    return f'http://router.project-osrm.org/table/v1/{mode}/{coords}?annotations=duration,distance'
+
+# lazy poi objects waiting to be geodecoded in the next batch
+# keyed by id() instead of being a WeakSet because hashing a poi geodecodes it,
+# and weak so lazy POIs that are dropped before being used are never geodecoded
+_pending = weakref.WeakValueDictionary()
+
+"""Parses OSRM response and raises ValueError with the given message if the request
+failed or OSRM replied with code other than Ok
+"""
+
+def _osrm_json(status_code, content, error):
+    response_json = _loads(content) if status_code == 200 else None
+    if response_json is None or response_json.get('code') != 'Ok':
+        raise ValueError(error)
+    return response_json
+
+"""Tells requests-cache which responses can be written to the disk cache, OSRM
+replies to some failures with status 200 so we need to look at its code too
+"""
+
+def _cacheable(response):
+    if response.status_code != 200:
+        return False
+    if 'router.project-osrm.org' in response.url:
+        return _loads(response.content).get('code') == 'Ok'
+    return True
+
+"""Memoized url -> json fetches, so constructing the same POI or asking for the same
+route again (like re-running a notebook cell) doesn't go to the network at all.
+Failed requests raise inside the memoized functions so exceptions are never cached.
+"""
+
+# key -> response, least recently used first. They are plain dictionaries
+# instead of lru_cache so batches can look them up and fill them as well
+_geocode_cache = OrderedDict()      # (name, country) -> Nominatim response
+_route_cache = OrderedDict()        # (src, dest, mode) -> OSRM route response
+_CACHE_SIZE = 2048
+
+def _memo_get(cache, key):
+    response_json = cache.get(key)
+    if response_json is not None:
+        cache.move_to_end(key)
+    return response_json
+
+def _memo_put(cache, key, response_json):
+    cache[key] = response_json
+    cache.move_to_end(key)
+    if len(cache) > _CACHE_SIZE:
+        cache.popitem(last = False)
+
+"""Parse Nominatim/OSRM response (requests or httpx), store it in the memo and return it.
+For a failed request the error is returned instead of raised so one failure in a batch
+doesn't hide the results of the others.
+"""
+
+def _geocode_response(name, country, response):
+    if isinstance(response, BaseException):
+        return response
+    if response.status_code != 200:
+        return ValueError(f"We couldn't decode the address {name}, please make sure you entered it correctly")
+    response_json = _loads(response.content)
+    _memo_put(_geocode_cache, (name, country), response_json)
+    return response_json
+
+def _route_response(src, dest, mode, response):
+    if isinstance(response, BaseException):
+        return response
+    try:
+        response_json = _osrm_json(response.status_code, response.content, f"OSRM couldn't find a route between {src} and {dest}")
+    except ValueError as error:
+        return error
+    _memo_put(_route_cache, (src, dest, mode), response_json)
+    return response_json
+
+"""Return the response of the query from the memo, or else fetch it through the session
+(and its disk cache if enabled) and remember it. Raises if the request failed.
+"""
+
+def _cached_fetch(cache, key, make_url, parse):
+    response_json = _memo_get(cache, key)
+    if response_json is None:
+        # try to issue this request from your terminal or smth to see the full response
+        response = poi._session.get(make_url(*key), timeout = _TIMEOUT)
+        response_json = parse(*key, response)
+        if isinstance(response_json, BaseException):
+            raise response_json
+    return response_json
+
+def _geocode_json(name, country):
+    return _cached_fetch(_geocode_cache, (name, country), _geocode_url, _geocode_response)
+
+def _route_json(src, dest, mode):
+    return _cached_fetch(_route_cache, (src, dest, mode), _route_url, _route_response)
+
+"""Fetches many queries concurrently through the same caches as _cached_fetch. Queries
+in the memo don't go to the network, and the others go through the disk cache session
+if it is enabled or else through one async client. Returns the response of every query
+in order, or the error if its request failed.
+"""
+
+def _cached_batch(cache, keys, make_url, parse, concurrency):
+    results = [_memo_get(cache, key) for key in keys]
+    misses = [i for i, result in enumerate(results) if result is None]
+    if not misses:
+        return results
+
+    urls = [make_url(*keys[i]) for i in misses]
+    if hasattr(poi._session, "cache"):
+        # the disk cache only sees the requests going through its session
+        def _get(url):
+            try:
+                return poi._session.get(url, timeout = _TIMEOUT)
+            except Exception as error:
+                return error
+        with ThreadPoolExecutor(max_workers = concurrency) as executor:
+            responses = list(executor.map(_get, urls))
+    else:
+        responses = _run(_fetch_all(urls, concurrency, return_exceptions = True))
+
+    for i, response in zip(misses, responses):
+        results[i] = parse(*keys[i], response)
+    return results
+
+@lru_cache(maxsize = 256)
+def _table_json(coords, mode):
+    response = poi._session.get(_table_url(coords, mode), timeout = _TIMEOUT)
+    return _osrm_json(response.status_code, response.content, f"OSRM couldn't find the travel matrix between {coords}")
+
+"""Fetches all the urls concurrently over one client, at most `concurrency`
+requests are in flight at the same time. Responses are returned in the same order of the urls,
+with return_exceptions the exception of a failed request takes its place instead of being raised.
+It needs httpx package to be installed, and uses HTTP/2 only if h2 package is installed too.
+"""
+
+async def _fetch_all(urls, concurrency = 8, return_exceptions = False):
+    import httpx
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(http2 = find_spec("h2") is not None,
+                                 limits = httpx.Limits(max_connections = 16),
+                                 timeout = httpx.Timeout(_TIMEOUT[1], connect = _TIMEOUT[0]),
+                                 headers = {"User-Agent": _USER_AGENT}) as client:
+        async def _get(url):
+            async with semaphore:
+                return await client.get(url)
+        return await asyncio.gather(*[_get(url) for url in urls], return_exceptions = return_exceptions)
+
+"""Runs the coroutine till completion and returns its result. Jupyter already has
+a running event loop in the main thread and asyncio.run refuses to nest inside it,
+so in that case we run the coroutine on its own event loop in a worker thread.
+"""
+
+def _run(coroutine):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers = 1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+"""Extracts (address, osmid, coordinates) from Nominatim geocodejson response
+of the first place with the given osm_type, or the first place of any type if
+osm_type is None
+"""
+
+def _parse_geocode(response_json, osm_type = None):
+    # the response may contain multiple places with
+    # the same name, we will only take the first result
+    # of the response which "probably" would be the place you wanted
+    # One other thing, maybe you wanted place "x" but there is
+    # a way called "x" and a node called "x" (remember osm data types)
+    # so if you don't specify osm_type what you get could be the way 
+    # not the node which you probably wanted
+    # it won't matter at all most of the time but you need to know that
+    place = next((feature for feature in response_json.get('features', []) \
+                    if osm_type is None or feature['properties']['geocoding']['osm_type'] == osm_type), None)
+
+    if place is None:
+        raise ValueError(f"Nominatim didn't find any place of type {osm_type or 'node/way/relation'} with that address")
+
+    geocoding = place['properties']['geocoding']
+    address = geocoding['label']
+    osmid = geocoding['osm_id']
+    coordinates = tuple(place['geometry']['coordinates']) # (longitude, latitude)
+    return address, osmid, coordinates
+
+"""Builds the route dictionary returned by poi.route_to from OSRM route response
+"""
+
+def _parse_route(response_json):
+    route = response_json["routes"][0]
+    cost = route["distance"]
+    duration = route["duration"]
+
+    # the full geometry of the route comes as one compact encoded polyline string
+    # and decodes to (latitude, longitude) points which is what ipyleaflet expects
+    route_coords = decode_polyline6(route["geometry"])
+    
+    return {'coords' : route_coords, 
+            'length' : cost,
+            'duration' : duration}
 
 
 """Class for creating POI (point of interest) with its full detailed geographic data
@@ -28,6 +288,9 @@ class poi:
     name: the name/address of the POI
     country: the name of the country of the POI
     osm_type: data types of OSM entities [node - way - relation]
+    lazy: if True Nominatim isn't called till you use the POI address/osmid/coordinates,
+          and then all the lazy POIs that haven't been geodecoded yet are geodecoded
+          together concurrently instead of one by one
 
     Examples
     -------
@@ -36,40 +299,168 @@ class poi:
     ... (-79.3973638, 43.6620257)
     >>> UofT.address
     ... 'University of Toronto, St George Street, University—Rosedale, Old Toronto, Toronto, Peel, Golden Horseshoe, Ontario, M5T 2Z9, Canada'
+    >>> pois = [poi(name, "canada", lazy = True) for name in ["CN tower", "casa loma", "royal ontario museum"]]
+    >>> pois[0].coordinates     # geodecodes the three POIs at once
 
+    Caching
+    -------
+    Nominatim and OSRM responses are memoized in memory for the lifetime of the
+    python process, and optionally on disk across sessions with poi.enable_disk_cache().
+    OSM data rarely changes, but if you need fresh responses call poi.clear_cache()
+    which drops both the in-memory and the on-disk cache.
+
+    Lazy POIs and poi.geocode_many are geodecoded with at most poi.nominatim_concurrency
+    requests at the same time. It is 1 by default because of the usage policy of the public Nominatim server
+    (1 request/second), increase it if you are using your own Nominatim instance.
+
+    """
+
+    # using __slots__ for optimization
+    __slots__ = ['_query', '_address', '_osmid', '_coordinates', '_resolved', '__weakref__']
+
+    # one pooled session shared by all the instances
+    _session = _make_session()
+
+    # maximum number of Nominatim requests on the fly when geodecoding many POIs at once
+    nominatim_concurrency = 1
+
+    """Persists Nominatim/OSRM responses in sqlite database so they survive restarting
+    the notebook kernel. It needs requests-cache package to be installed.
+
+    Parameters
+    ----------
+    cache_name: the path of the sqlite database
+    expire_after: number of seconds after which the cached response is considered stale
+    """
+
+    @classmethod
+    def enable_disk_cache(cls, cache_name = "poi_cache", expire_after = 86400):
+        import requests_cache
+        cls._session = _make_session(requests_cache.CachedSession(cache_name, backend = "sqlite", expire_after = expire_after,
+                                                                  allowable_codes = (200,), filter_fn = _cacheable))
+
+    """Drops all the cached Nominatim/OSRM responses
     """
-    def __init__(self, name, country):
-        self.__geo_decode(name, country)
+
+    @classmethod
+    def clear_cache(cls):
+        _geocode_cache.clear()
+        _route_cache.clear()
+        _table_json.cache_clear()
+        if hasattr(cls._session, "cache"):
+            cls._session.cache.clear()
+
+    def __init__(self, name, country, osm_type = None, lazy = False):
+        self._query = (name, country, osm_type)
+        self._resolved = False
+        if lazy:
+            _geocode_url(name, country)     # fail fast on invalid queries
+            _pending[id(self)] = self
+        else:
+            self.__geo_decode(name, country, osm_type)
 
     """ Calls Nominatim API for geodecoding the address
     """
 
-    def __geo_decode(self, name, country):
+    def __geo_decode(self, name, country, osm_type):
+        self._set(*_parse_geocode(_geocode_json(name, country), osm_type))
 
-        # check https://nominatim.org/release-docs/develop/
+    def _set(self, address, osmid, coordinates):
+        self._address = address
+        self._osmid = osmid
+        self._coordinates = coordinates
+        self._resolved = True
 
-        # try to issue this request from your terminal or smth to see the full response
-        response = requests.get(f'https://nominatim.openstreetmap.org/search?q={name} - {country}&format=geocodejson')
+    """Geodecodes the POI if it is lazy and hasn't been geodecoded yet, along with
+    all the other pending lazy POIs in one concurrent batch
+    """
+
+    def _resolve(self):
+        if self._resolved:
+            return
+        poi._flush_pending()
+        # the batch swallows the errors of single POIs, so if this one failed
+        # we ask again on its own to raise the proper error
+        if not self._resolved:
+            self.__geo_decode(*self._query)
+
+    @classmethod
+    def _flush_pending(cls):
+        pending = [obj for obj in _pending.values() if not obj._resolved]
+        _pending.clear()
+        if not pending:
+            return
+
+        queries = [obj._query[:2] for obj in pending]
+        results = _cached_batch(_geocode_cache, queries, _geocode_url, _geocode_response, cls.nominatim_concurrency)
+        for obj, result in zip(pending, results):
+            if isinstance(result, BaseException):
+                continue
+            try:
+                obj._set(*_parse_geocode(result, obj._query[2]))
+            except ValueError:
+                pass
+
+    @property
+    def address(self):
+        self._resolve()
+        return self._address
+
+    @property
+    def osmid(self):
+        self._resolve()
+        return self._osmid
+
+    @property
+    def coordinates(self):
+        self._resolve()
+        return self._coordinates
+
+    """Creates poi object from already geodecoded data without calling Nominatim again
+    """
 
-        if response.status_code != 200:
-            raise ValueError("We couldn't decode the address, please make sure you entered it correctly")
+    @classmethod
+    def _from_parsed(cls, address, osmid, coordinates):
+        obj = cls.__new__(cls)
+        obj._query = None
+        obj._set(address, osmid, coordinates)
+        return obj
 
-        response_json = response.json()
+    """Geodecodes many places in the same country concurrently instead of one by one.
+    Keep in mind that the public Nominatim server has strict usage policy (1 request/second),
+    that is why by default it uses poi.nominatim_concurrency which is 1 unless you changed it
+    for your own Nominatim instance.
 
-        # the response may contain multiple places with
-        # the same name, we will only take the first result
-        # of the response which "probably" would be the place you wanted
-        # that is why we get the index zero from the response
-        # One other thing, maybe you wanted place "x" but there is
-        # a way called "x" and a node called "x" (remember osm data types)
-        # what you get could be the way not the node which you probably node
-        # it won't matter at all most of the time but you need to know that
-        index = 0
-        place = response_json['features'][index] 
+    Parameters
+    ----------
+    names: list of names/addresses of the POIs
+    country: the name of the country of all the POIs
+    osm_type: data types of OSM entities [node - way - relation]
+    concurrency: the maximum number of requests on the fly at the same time,
+                 poi.nominatim_concurrency if not given
 
-        self.address = place['properties']['geocoding']['label']
-        self.osmid = place['properties']['geocoding']['osm_id']
-        self.coordinates = tuple(place['geometry']['coordinates']) # (longitude, latitude)
+    Returns
+    -------
+    list of poi objects in the same order of names
+
+    Examples
+    -------
+    >>> pois = poi.geocode_many(["university of toronto", "CN tower"], "canada")
+    """
+
+    @classmethod
+    def geocode_many(cls, names, country, osm_type = None, concurrency = None):
+        if concurrency is None:
+            concurrency = cls.nominatim_concurrency
+        queries = [(name, country) for name in names]
+        results = _cached_batch(_geocode_cache, queries, _geocode_url, _geocode_response, concurrency)
+
+        pois = list()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            pois.append(cls._from_parsed(*_parse_geocode(result, osm_type)))
+        return pois
 
     """Takes another poi object and find the route between the calling object and 
     the other object with specified mode of transportation like car - bike - foot.
@@ -84,7 +475,7 @@ class poi:
     Returns
     -------
     Route dictionary: dictionary that consists of three keys
-                    1. 'route' which is the (lat, log) coordinates that defines the route
+                    1. 'coords' which is (N, 2) numpy array of (lat, log) coordinates that defines the route
                     2. 'length' the length of the route by meters
                     3. 'duration' this is how many seconds would it take to finish that route
                     OSRM calculates that based on multiple things like max speed
@@ -97,31 +488,81 @@ class poi:
         src = self.coordinates
         dest = destination.coordinates
 
-        # check http://project-osrm.org/docs/v5.22.0/api/#general-options
-
-        response = requests.get(f'http://router.project-osrm.org/route/v1/{mode}/{src[0]},{src[1]};{dest[0]},{dest[1]}?steps=true')
-        response_json = response.json()
-
-        if response_json['code'] != 'Ok':
-            raise ValueError(f"OSRM couldn't find a route between {src} and {dest}")
-
-        route = response_json["routes"][0]
-        cost = route["distance"]
-        duration = route["duration"]
-        legs = route["legs"][0]
-        steps = legs["steps"]
-
-        route_coords = list()
-        for route_step in steps:
-            maneuver = route_step["maneuver"]
-            location = maneuver["location"]
-            location = location[::-1]   # from (longitude, latitude) to (latitude, longitude) so ipyleaflet can handle it
-            route_coords.append(tuple(location))
-        
-        return {'coords' : route_coords, 
-                'length' : cost,
-                'duration' : duration}
+        return _parse_route(_route_json(src, dest, mode))
+
+    """Finds the routes between every source and every destination concurrently
+    instead of calling route_to for each pair one after the other.
+
+    Parameters
+    ----------
+    sources: list of poi objects that would be the origins of the routes
+    dests: list of poi objects that would be the targets of the routes
+    mode: this is the mode of transportation, there are three available modes: car/driving - bike - foot
+    concurrency: the maximum number of requests on the fly at the same time
+
+    Returns
+    -------
+    matrix: list of lists where matrix[i][j] is the route dictionary (same as route_to)
+            from sources[i] to dests[j]
+    """
+
+    @classmethod
+    def route_matrix(cls, sources, dests, mode = "driving", concurrency = 8):
+        queries = [(src.coordinates, dest.coordinates, mode) for src in sources for dest in dests]
+        results = _cached_batch(_route_cache, queries, _route_url, _route_response, concurrency)
+
+        routes = list()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            routes.append(_parse_route(result))
+        return [routes[i * len(dests):(i + 1) * len(dests)] for i in range(len(sources))]
+
+    """Finds the travel durations and distances between every two POIs with one
+    request to OSRM table service instead of calling route_to for every pair.
+    It doesn't return the geometry of the routes, use route_to/route_matrix for that.
+
+    Parameters
+    ----------
+    pois: list of poi objects
+    mode: this is the mode of transportation, there are three available modes: car/driving - bike - foot
+
+    Returns
+    -------
+    Matrices dictionary: dictionary that consists of two keys
+                    1. 'durations' (N, N) numpy array where [i, j] is how many seconds it takes from pois[i] to pois[j]
+                    2. 'distances' (N, N) numpy array where [i, j] is the length in meters of the route from pois[i] to pois[j]
+                    pairs that OSRM couldn't find a route between are nan
+    """
+
+    @classmethod
+    def travel_matrix(cls, pois, mode = "driving"):
+        coords = tuple(p.coordinates for p in pois)
+        response_json = _table_json(coords, mode)
+
+        # OSRM returns null for unreachable pairs which becomes nan
+        return {'durations' : np.asarray(response_json['durations'], dtype = np.float32),
+                'distances' : np.asarray(response_json['distances'], dtype = np.float32)}
     
+    """Calculates the great-circle distance between every two POIs locally without
+    calling OSRM, so you can use it to filter the POIs that are obviously far
+    from each other before asking OSRM for the actual routes.
+
+    Parameters
+    ----------
+    pois: list of poi objects
+
+    Returns
+    -------
+    distances: (N, N) numpy array where distances[i, j] is the distance
+               in meters between pois[i] and pois[j]
+    """
+
+    @classmethod
+    def pairwise_distance(cls, pois):
+        pois = PoiArray(pois)
+        return pois.distance_to(pois)
+
     def __eq__(self, other):
         return self.osmid == other.osmid
 
@@ -135,6 +576,88 @@ class poi:
         return f"Name: {name} ID: {self.osmid}"
 
 
+"""Collection of POIs stored column-wise, every attribute of the POIs is kept in
+its own contiguous numpy array instead of being scattered over many poi objects,
+so operations over all the POIs at once (distances, bounding boxes, ...) are vectorized.
+
+Parameters
+----------
+pois: list of poi objects
+precision: 'fp64' or 'fp32' for the coordinates, float32 still has a couple of meters
+           resolution on the surface of the earth and halves the memory of big collections
+
+Examples
+-------
+>>> pois = PoiArray(poi.geocode_many(["university of toronto", "CN tower", "casa loma"], "canada"))
+>>> pois.distance_to(pois)
+>>> pois.within_bbox(-79.40, 43.64, -79.38, 43.67)
+... array([ True,  True, False])
+"""
+
+class PoiArray:
+    _dtypes = {'fp32': np.float32, 'fp64': np.float64}
+
+    def __init__(self, pois, precision = 'fp64'):
+        if precision not in self._dtypes:
+            raise ValueError(f"precision should be one of {list(self._dtypes)}, got {precision}")
+
+        dtype = self._dtypes[precision]
+        count = len(pois)
+        self.lons = np.fromiter((p.coordinates[0] for p in pois), dtype = dtype, count = count)
+        self.lats = np.fromiter((p.coordinates[1] for p in pois), dtype = dtype, count = count)
+        self.osmids = np.fromiter((p.osmid for p in pois), dtype = np.int64, count = count)
+        self.addresses = [p.address for p in pois]
+
+        # spatial index built lazily on the first nearest neighbour query
+        self._tree = None
+
+    def __len__(self):
+        return len(self.addresses)
+
+    """Great-circle distance in meters between every POI of this array and every POI
+    of the other array as (len(self), len(other)) numpy array
+    """
+
+    def distance_to(self, other):
+        return haversine(self.lats, self.lons, other.lats, other.lons)
+
+    """Boolean mask of the POIs that are inside the bounding box
+    """
+
+    def within_bbox(self, minlon, minlat, maxlon, maxlat):
+        return (self.lons >= minlon) & (self.lons <= maxlon) & \
+               (self.lats >= minlat) & (self.lats <= maxlat)
+
+    """Builds BallTree with haversine metric over the POIs so nearest neighbour
+    queries take O(log N) instead of scanning all the POIs. It needs scikit-learn.
+    """
+
+    def build_index(self):
+        from sklearn.neighbors import BallTree
+        points = np.deg2rad(np.c_[self.lats, self.lons].astype(np.float64))
+        self._tree = BallTree(points, metric = 'haversine')
+        return self
+
+    """Finds the k nearest POIs to the given location
+
+    Parameters
+    ----------
+    lat, lon: the location (degrees) we want the POIs near to
+    k: number of POIs to return
+
+    Returns
+    -------
+    distances: numpy array of the great-circle distances in meters sorted ascending
+    indices: numpy array of the indices of these POIs in this array
+    """
+
+    def nearest(self, lat, lon, k = 1):
+        if self._tree is None:
+            self.build_index()
+        distances, indices = self._tree.query(np.deg2rad([[lat, lon]]), k = k)
+        return distances[0] * EARTH_RADIUS, indices[0]
+
+
 ##########################################################################################################
 ##########################################################################################################
 ##########################################################################################################
@@ -148,7 +671,7 @@ It is meant to be used with the routes returned from poi objects.
 
 Parameters
 ----------
-route: is a list of coordinates point (lat, log)
+route: is a list/array of coordinates point (lat, log)
 zoom: is how much zoom the map would make on the route rendered
 
 Returns
@@ -157,6 +680,8 @@ m: ipyleaflet map
 """
 
 def drawRoute(route, zoom = 12):
+    route = np.asarray(route).tolist()
+
     # getting the center of the route
     m = Map(center = route[len(route) // 2], zoom = zoom)
 
@@ -168,17 +693,15 @@ def drawRoute(route, zoom = 12):
     dest_marker = Marker(location = route[len(route) - 1], draggable = False)
     m.add_layer(dest_marker)
 
-    # draw AntPath between every two consecutive nodes
-    for u, v in zip(route[0:], route[1:]):
-        step = map(list, [u, v])
-        step_path = AntPath(
-            locations = [*step],
-            dash_array=[1, 10],
-            delay=1000,
-            color='black',
-            pulse_color='red'
-        )
-        m.add_layer(step_path)
+    # draw one AntPath through all the nodes of the route
+    route_path = AntPath(
+        locations = [*map(list, route)],
+        dash_array=[1, 10],
+        delay=1000,
+        color='black',
+        pulse_color='red'
+    )
+    m.add_layer(route_path)
 
     return m
 
@@ -210,12 +733,14 @@ def drawPOIS(POIS, zoom=12):
 
     # creating the popup messages on the markers
     # with the name of the POI
+    markers = []
     for poi in POIS:
         name = poi.address.split(",")[0]
         marker = Marker(location=poi.coordinates[::-1])
         text = HTML()
         text.value = f"{name}"
         marker.popup = text
-        m.add_layer(marker)
+        markers.append(marker)
+    m.add_layer(LayerGroup(layers=markers))
 
     return m
\ No newline at end of file
@@ -1,11 +1,79 @@
 """ Provides some utilities to ease the usage of ipyleaflet with osmnx """
 
 import pandas, numpy
+import weakref
 import ipyleaflet as lf
 import folium as fl
 import osmnx as ox
 import networkx as nx
 
+# graph -> dictionary of the things we computed for the graphs we have drawn (GeoDataFrames
+# and center node), entries go away by themselves when the graph is garbage collected
+_graph_cache = weakref.WeakKeyDictionary()
+
+"""Return the cache entry of the graph. If the number of nodes or edges of the graph
+changed since the entry was made it is thrown away, for any other in-place modification
+call clear_cache().
+"""
+
+def _cache_entry(G):
+    size = (len(G), G.number_of_edges())
+    entry = _graph_cache.get(G)
+    if entry is None or entry['size'] != size:
+        entry = {'size': size}
+        _graph_cache[G] = entry
+    return entry
+
+"""Return the (nodes, ways) GeoDataFrames of the graph, building them only the first
+time the graph is drawn
+"""
+
+def _get_gdfs(G):
+    entry = _cache_entry(G)
+    if 'gdfs' not in entry:
+        entry['gdfs'] = ox.graph_to_gdfs(G)
+    return entry['gdfs']
+
+"""Forget everything computed for the graphs drawn before
+"""
+
+def clear_cache():
+    _graph_cache.clear()
+
+"""Find the center node of the graph, which is only needed to center the map.
+ox.stats.extended_stats(ecc=True) computes a lot of stats we don't use, so we
+compute the center directly on the largest (strongly) connected component -- eccentricity
+is undefined on disconnected graphs -- with the same edge lengths as weights, and
+remember it so drawing the same graph again doesn't pay this all pairs shortest paths cost again.
+"""
+
+def _graph_center(G):
+    entry = _cache_entry(G)
+    if 'center' not in entry:
+        if G.is_directed():
+            component = max(nx.strongly_connected_components(G), key = len)
+        else:
+            component = max(nx.connected_components(G), key = len)
+        entry['center'] = nx.center(G.subgraph(component), weight = 'length')[0]
+    return entry['center']
+
+"""Map every (u, v) edge of the ways GeoDataFrame to its geometry so edges of a route
+can be looked up in O(1) instead of scanning the whole frame with a query per edge.
+Depending on osmnx version u and v are either columns or levels of the index.
+For parallel edges we keep the first one.
+"""
+
+def _edge_geometries(ways_frame):
+    if 'u' in ways_frame.columns:
+        us, vs = ways_frame['u'].to_numpy(), ways_frame['v'].to_numpy()
+    else:
+        us, vs = ways_frame.index.get_level_values('u'), ways_frame.index.get_level_values('v')
+
+    edge_geom = {}
+    for u, v, geom in zip(us, vs, ways_frame['geometry'].to_numpy()):
+        edge_geom.setdefault((u, v), geom)
+    return edge_geom
+
 """Draw leaflet map based for the graph passed to the function
 with highlighting certain nodes with a marker. ipyleaflet rendering 
 can be a little slow when dealing with graphs with many node, in that 
@@ -29,43 +97,43 @@ def draw_map(G, highlight = None , zoom = 16):
     if len(G) >= 1000:
         print(f"The graph has {len(G)} which is a lot, we will use basic faster folium instead")
         if highlight:
-            center_osmid = ox.stats.extended_stats(G,ecc=True)['center'][0]
-            G_gdfs = ox.graph_to_gdfs(G)
+            G_gdfs = _get_gdfs(G)
             nodes_frame = G_gdfs[0]
             ways_frame = G_gdfs[1]
             m = ox.plot_graph_folium(G = G)
-            for node_osmid in highlight:
-                node = nodes_frame.loc[node_osmid]
-                node_xy = [node['y'], node['x']]
-                fl.Marker(node_xy).add_to(m)
+            markers = fl.FeatureGroup(name = 'highlight')
+            for node_xy in nodes_frame.loc[list(highlight), ['y', 'x']].to_numpy().tolist():
+                fl.Marker(node_xy).add_to(markers)
+            markers.add_to(m)
         else: 
             m = ox.plot_graph_folium(G = G)
         return m
         
-    center_osmid = ox.stats.extended_stats(G,ecc=True)['center'][0]
-    G_gdfs = ox.graph_to_gdfs(G)
+    center_osmid = _graph_center(G)
+    G_gdfs = _get_gdfs(G)
     nodes_frame = G_gdfs[0]
     ways_frame = G_gdfs[1]
     center_node = nodes_frame.loc[center_osmid]
     location = (center_node['y'], center_node['x'])
     m = lf.Map(center = location, zoom = zoom)
 
-    for _, row in ways_frame.iterrows():
-        lines = lf.Polyline(
-            locations = [list(elem)[::-1] for elem in [*row['geometry'].coords]],
-            color = "black",
-            fill = False,
-            weight = 1
-        )
-        m.add_layer(lines)
+    # all the ways go into one multi-polyline layer instead of a layer per way
+    # (lon, lat) -> (lat, lon) is a single column swap on the coordinates array of each way
+    ways = [numpy.asarray(geom.coords)[:, ::-1].tolist() for geom in ways_frame['geometry'].to_numpy()]
+    lines = lf.Polyline(
+        locations = ways,
+        color = "black",
+        fill = False,
+        weight = 1
+    )
+    m.add_layer(lines)
 
     # if we want to mark some specific nodes
     if highlight:
-        for node_osmid in highlight:
-            node = nodes_frame.loc[node_osmid]
-            node_xy = (node['y'], node['x'])
-            marker = lf.Marker(location = node_xy, draggable = False)
-            m.add_layer(marker)
+        # one lookup for all the nodes instead of one per node
+        nodes_yx = nodes_frame.loc[list(highlight), ['y', 'x']].to_numpy().tolist()
+        markers = [lf.Marker(location = tuple(node_xy), draggable = False) for node_xy in nodes_yx]
+        m.add_layer(lf.LayerGroup(layers = markers))
 
     return m
 
@@ -94,38 +162,44 @@ def draw_route(G, route, zoom = 16):
         m = ox.plot_route_folium(G = G, route = route)
         return m
 
-    center_osmid = ox.stats.extended_stats(G,ecc=True)['center'][0]
-    G_gdfs = ox.graph_to_gdfs(G)
+    G_gdfs = _get_gdfs(G)
     nodes_frame = G_gdfs[0]
     ways_frame = G_gdfs[1]
-    center_node = nodes_frame.loc[center_osmid]
-    location = (center_node['y'], center_node['x'])
-    m = lf.Map(center = location, zoom = zoom)
+    edge_geom = _edge_geometries(ways_frame)
 
-    start_node = nodes_frame.loc[route[0]]
-    end_node = nodes_frame.loc[route[len(route)-1]]
+    # we center the map on the middle node of the route, it frames
+    # the route better than the center of the graph and it is free
+    start_xy, location, end_xy = map(tuple, nodes_frame.loc[[route[0], route[len(route) // 2], route[len(route)-1]], ['y', 'x']].to_numpy().tolist())
+    m = lf.Map(center = location, zoom = zoom)
 
-    start_xy = (start_node['y'], start_node['x'])
-    end_xy = (end_node['y'], end_node['x'])
     marker = lf.Marker(location = start_xy, draggable = False)
     m.add_layer(marker)
     marker = lf.Marker(location = end_xy, draggable = False)
     m.add_layer(marker)
 
+    # stitch the geometries of all the edges into one AntPath layer
+    route_coords = []
     for u, v in zip(route[0:], route[1:]):
-        try:
-            x, y = (ways_frame.query(f'u == {u} and v == {v}').to_dict('list')['geometry'])[0].coords.xy
-        except:
-            x, y = (ways_frame.query(f'u == {v} and v == {u}').to_dict('list')['geometry'])[0].coords.xy
-        points = map(list, [*zip([*y],[*x])])
-        ant_path = lf.AntPath(
-            locations = [*points], 
-            dash_array=[1, 10],
-            delay=1000,
-            color='red',
-            pulse_color='black'
-        )
-        m.add_layer(ant_path)
+        geom = edge_geom.get((u, v))
+        reverse = geom is None
+        if reverse:
+            geom = edge_geom[(v, u)]
+        x, y = geom.coords.xy
+        points = numpy.column_stack((y, x))
+        if reverse:
+            # the edge is stored the other way around so its points go from v to u
+            points = points[::-1]
+        # every edge starts where the previous one ended
+        route_coords.extend(points[1 if route_coords else 0:].tolist())
+
+    ant_path = lf.AntPath(
+        locations = route_coords, 
+        dash_array=[1, 10],
+        delay=1000,
+        color='red',
+        pulse_color='black'
+    )
+    m.add_layer(ant_path)
 
     return m
     
\ No newline at end of file